@@ -12,15 +12,50 @@ try:
 except ImportError:
     pass
 
+import csv
+import io
 import shutil
+import struct
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
 
 import h5py
 import numpy as np
 import pandas as pd
 
-from . import strings_tools as st
 from . import filesystem_tools as ft
 
+# Use the multithreaded Arrow csv reader and writer when available.
+try:
+    import pyarrow
+    import pyarrow.csv
+    CSV_ENGINE = 'pyarrow'
+except ImportError:
+    CSV_ENGINE = 'c'
+
+# Compress hdf5 datasets with Blosc + bitshuffle when the filter plugin
+# is installed, otherwise use fast gzip, which every HDF5 build reads.
+try:
+    import hdf5plugin
+    HDF5_COMPRESSION = dict(hdf5plugin.Blosc(
+        cname='lz4', clevel=5, shuffle=hdf5plugin.Blosc.BITSHUFFLE))
+except ImportError:
+    HDF5_COMPRESSION = {'compression': 'gzip', 'compression_opts': 1,
+                        'shuffle': True}
+HDF5_CHUNK_BYTES = 1 << 20
+
+# Columnar output formats, by file suffix. Csv is used otherwise.
+DATAFRAME_FORMATS = ('.parquet', '.feather')
+
+# Options for new hdf5 files: latest (compact) metadata format and
+# paged file space aggregation. Files returned for reading also get a
+# large raw data chunk cache; its slots table keeps the default size,
+# since it is allocated for every dataset.
+HDF5_FILE_OPTIONS = {'libver': 'latest', 'fs_strategy': 'page'}
+HDF5_WRITE_OPTIONS = dict(HDF5_FILE_OPTIONS,
+                          rdcc_nbytes=256 * 1024 * 1024)
+
 
 class H5(h5py._hl.files.File):
     """A class to add functionally to h5py objects.
@@ -49,10 +84,9 @@ class H5(h5py._hl.files.File):
         List of str
             Attributes names of all first level datasets.
         """
-        get_uniques = st.get_uniques_in_list_of_lists
-        m_attrs = get_uniques([list(b.attrs) for v in db_path.values()
-                               for b in v.values()])
-        return m_attrs
+        m_attrs = chain.from_iterable(b.attrs for v in db_path.values()
+                                      for b in v.values())
+        return list(dict.fromkeys(m_attrs))
 
     @staticmethod
     def save_npz_in_hdf5(npz_files_list, hdf5_path=None,
@@ -78,27 +112,44 @@ class H5(h5py._hl.files.File):
 
         # Create output hdf5 file
         #
-        # Iterate over npz files list. Create a group  for each npz file,
-        # using relative orders as groups keys.
-        output = H5(hdf5_path, 'w')
-        for model_pos, npz_path in enumerate(npz_files_list):
+        # Create a group for each npz file, using relative orders as
+        # groups keys, and set values of interest as group attributes.
+        output = H5(hdf5_path, 'w', **HDF5_WRITE_OPTIONS)
+        groups = []
+        for model_pos in range(len(npz_files_list)):
             model_no = model_pos + 1
             grp = output.create_group(str(model_no))
-
-            # Set values of interest as group attributes.
             if add_attributes:
-                for k, value in add_attributes[int(model_no)].items():
-                    grp.attrs[k] = value
+                grp.attrs.update(add_attributes[int(model_no)])
+            groups.append(grp)
 
-            # Load npz arrays and save them as groups data-sets. Keys
-            # will be whatever keys were present in each npz file.
-            arrays = np.load(npz_path)
-            for k, value in arrays.items():
-                grp.create_dataset(k, data=value)
+        # Load npz arrays and save them as groups data-sets. Keys
+        # will be whatever keys were present in each npz file.
+        #
+        # Arrays are streamed one at a time, decoding the next one in a
+        # background thread while the current one is written.
+        arrays = ((groups[pos], k, value)
+                  for pos, npz_path in enumerate(npz_files_list)
+                  for k, value in generate_npz_arrays(npz_path))
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            pending = pool.submit(next, arrays, None)
+            while True:
+                item = pending.result()
+                if item is None:
+                    break
+                pending = pool.submit(next, arrays, None)
+                grp, k, value = item
+                if value.ndim and value.size:
+                    grp.create_dataset(k, data=value,
+                                       chunks=calculate_hdf5_chunks(
+                                           value.shape, value.itemsize),
+                                       **HDF5_COMPRESSION)
+                else:
+                    grp.create_dataset(k, data=value)
 
         # Print output file structure
         if verbose:
-            output.show_hdf5_structure()
+            output.show_structure()
         return output
 
     @property
@@ -167,13 +218,12 @@ class H5(h5py._hl.files.File):
 
         # Set all datasets keys as default root groups keys.
         if not common_dsets_keys:
-            get_unique = st.get_uniques_in_list_of_lists
-            common_dsets_keys = get_unique([v.keys() for v
-                                            in self.values()])
+            common_dsets_keys = list(dict.fromkeys(chain.from_iterable(
+                v.keys() for v in self.values())))
 
         # Open temp hdf5 file and iterate trough original datasets,
         # swapping groups names with datasets, including attributes.
-        out = H5(temp_path, 'w')
+        out = H5(temp_path, 'w', **HDF5_FILE_OPTIONS)
         datasets_attrs = {}
         for groups in self.values():
             for dts_key, dts in groups.items():
@@ -182,8 +232,10 @@ class H5(h5py._hl.files.File):
             out_grp = out.create_group(key)
             out_grp.attrs.update(datasets_attrs[key])
             for group_n, group in self.items():
-                dts = out_grp.create_dataset(group_n, data=group[key])
-                dts.attrs.update(group.attrs)
+                # Copy stored chunks as they are, without decompressing
+                # and compressing them again.
+                out_grp.copy(group[key], group_n, without_attrs=True)
+                out_grp[group_n].attrs.update(group.attrs)
 
         # Close both original hdf5 and temp files. Copy temporal hdf5
         # as original, delete it and redefine H5 object.
@@ -195,12 +247,155 @@ class H5(h5py._hl.files.File):
 
     def show_structure(self):
         """Print main structure of a hdf5 file."""
-        def print_attrs(name, _):
-            print(name)
-        self.visititems(print_attrs)
+        # Visit names only, without instantiating each node object.
+        self.visit(print)
+
+
+def calculate_hdf5_chunks(shape, itemsize):
+    """Calculate a hdf5 chunk shape of about `HDF5_CHUNK_BYTES` size.
+
+    Chunk dimensions are filled starting from the last axis, so chunks
+    keep contiguous rows of data.
+
+    Parameters
+    ----------
+    shape : tuple of int
+        Shape of dataset to be chunked.
+    itemsize : int
+        Size in bytes of each dataset element.
+
+    Returns
+    -------
+    tuple of int
+        Chunk shape, or None for scalar datasets.
+    """
+    if not shape:
+        return None
+    chunk_elements = max(1, HDF5_CHUNK_BYTES // itemsize)
+    chunks = []
+    for dim in reversed(shape):
+        size = max(1, min(dim, chunk_elements))
+        chunks.insert(0, size)
+        chunk_elements = max(1, chunk_elements // size)
+    return tuple(chunks)
+
+
+def check_arrow_csv_columns(data_frame):
+    """Check if data can be written to csv by Arrow as pandas does.
 
+    Only integer and float columns qualify. Float columns whose finite
+    values are all integral do not, since Arrow writes them without
+    decimal point and they would be read back as integers.
 
-def reformat_peer_data_csv(csv_file_path, time_step=0.005):
+    Parameters
+    ----------
+    data_frame : pandas DataFrame or dict of numpy arrays
+        Data to check.
+
+    Returns
+    -------
+    bool
+        True if all columns can be written by Arrow.
+    """
+    for _, column in data_frame.items():
+        values = np.asarray(column)
+        if values.dtype.kind not in {'i', 'u', 'f'}:
+            return False
+        if values.dtype.kind == 'f':
+            finite = values[np.isfinite(values)]
+            if finite.size and not np.any(np.mod(finite, 1)):
+                return False
+    return True
+
+
+def generate_npz_arrays(npz_path):
+    """Create generator that loads arrays stored in a npz file.
+
+    If the npz file is not compressed, arrays are read straight from
+    the underlying file, skipping the zip module buffered reader.
+    Otherwise, arrays are loaded one by one through numpy.
+
+    Parameters
+    ----------
+    npz_path : Path
+        Npz saved numpy arrays.
+
+    Yields
+    ------
+    str
+        Array name.
+    numpy array
+        Loaded array.
+    """
+    with zipfile.ZipFile(str(npz_path)) as zip_file:
+        members = zip_file.infolist()
+        if all(i.compress_type == zipfile.ZIP_STORED for i in members):
+            for info in members:
+                # Skip local file header, whose extra field may differ
+                # from the central directory one.
+                zip_file.fp.seek(info.header_offset)
+                header = zip_file.fp.read(30)
+                name_len, extra_len = struct.unpack('<HH', header[26:30])
+                zip_file.fp.seek(info.header_offset + 30 + name_len +
+                                 extra_len)
+                yield info.filename[:-4], np.lib.format.read_array(
+                    zip_file.fp, allow_pickle=False)
+            return
+    with np.load(npz_path) as arrays:
+        for k in arrays.files:
+            yield k, arrays[k]
+
+
+def read_numeric_csv(csv_file_path):
+    """Read a header-less csv file of numeric data into a data frame.
+
+    The Arrow engine is used if installed. Since it does not accept
+    ragged rows, a short last row, as in PEER records, is split off and
+    appended padded with nan values. Other ragged files are read with
+    the pandas C parser.
+
+    Parameters
+    ----------
+    csv_file_path : Path
+        Csv file to load data from.
+
+    Returns
+    -------
+    pandas DataFrame
+        Loaded numeric data.
+    """
+    if CSV_ENGINE == 'pyarrow':
+        # Split short last row off file contents, if any.
+        data = Path(csv_file_path).read_bytes().rstrip(b'\r\n')
+        body, _, tail = data.rpartition(b'\n')
+        width = data[:data.find(b'\n')].count(b',') + 1
+        if not body or tail.count(b',') + 1 >= width:
+            body, tail = data, None
+
+        # Parse full rows with Arrow and short row as floats, append
+        # it to them. Non numeric short rows fall back to pandas too.
+        try:
+            if tail is not None:
+                row = [float(i) if i.strip() else np.nan for
+                       i in tail.split(b',')]
+                row += [np.nan] * (width - len(row))
+            table = pyarrow.csv.read_csv(
+                pyarrow.py_buffer(body), pyarrow.csv.ReadOptions(
+                    autogenerate_column_names=True))
+        except ValueError:
+            pass
+        else:
+            data_frame = table.to_pandas()
+            data_frame.columns = range(data_frame.shape[1])
+            if tail is not None:
+                data_frame.loc[len(data_frame)] = row
+            return data_frame
+    return pd.read_csv(csv_file_path, header=None, engine='c',
+                       float_precision='high')
+
+
+def reformat_peer_data_csv(csv_file_path, time_step=0.005,
+                           output_format='csv'):
     """Reformat PEER motion records to column-wise, and save to csv.
 
     Typically, PEER data is given in a plane text file, with data
@@ -213,36 +408,56 @@ def reformat_peer_data_csv(csv_file_path, time_step=0.005):
         Csv file to load data from.
     time_step : float
         Time step of record. Needs to be set to create time column.
+    output_format : {'csv', 'parquet', 'feather'}, optional
+        Format of output file. Default is 'csv'.
 
     Returns
     -------
     Path
         Path of corrected cdv file.
+
+    Raises
+    ------
+    AssertionError
+        Not supported `output_format`.
     """
+    assert output_format in {'csv', 'parquet', 'feather'},\
+        'Output format should be csv, parquet or feather'
+
     # Normalize input as Path object and read csv file.
     csv_file_path = Path(csv_file_path).with_suffix('.csv')
-    data_frame = pd.read_csv(csv_file_path, header=None)
-
-    # Transpose data for handling. Extract it column-wise in new df.
-    df_trans = data_frame.transpose()
-    column = [df_trans[i] for i in df_trans]
-    combined = pd.concat(column, ignore_index=True)
-
-    # Create new data-frame and add time column.
-    df_out = pd.DataFrame()
-    df_out['T'] = np.arange(0, time_step * (len(combined) - 2), time_step)
-    df_out['DATA'] = combined
+    data_frame = read_numeric_csv(csv_file_path)
+
+    # Flatten data row-wise (C order, same as concatenating the rows)
+    # in a single array. Trim the trailing nan values that pad the last
+    # (ragged) row of the record, without masking the whole array.
+    values = data_frame.to_numpy(dtype=np.float64)
+    size = values.size - values.shape[1]
+    last_row_valid = np.flatnonzero(~np.isnan(values[-1]))
+    if last_row_valid.size:
+        size += last_row_valid[-1] + 1
+    combined = values.ravel(order='C')[:size]
+
+    # Gather output columns, adding time column, scaled in place.
+    time = np.arange(len(combined), dtype=np.float64)
+    time *= time_step
+    columns = {'T': time, 'DATA': combined}
 
     # Save corrected csv file in new csv file.
     output_path = ft.modify_filename_in_path(csv_file_path,
                                              added='_corrected', prefix=False)
-    df_out.to_csv(output_path, index=False)
+    output_path = output_path.with_suffix('.' + output_format)
+    write_dataframe(columns, output_path)
     return output_path
 
 
-def save_dataframe_safely(data_frame, output_csv, overwrite=False):
+def save_dataframe_safely(data_frame, output_csv, overwrite=False,
+                          engine=CSV_ENGINE):
     """Save pandas dataframe as csv, avoiding accidental overwriting.
 
+    Parquet and feather formats are used instead of csv if
+    `output_csv` has a '.parquet' or '.feather' suffix.
+
     Parameters
     ----------
     data_frame : pandas DataFrame
@@ -251,24 +466,102 @@ def save_dataframe_safely(data_frame, output_csv, overwrite=False):
         Path of output csv file.
     overwrite : bool, optional
         If True, allow overwrite of output file.
+    engine : {'pyarrow', 'c'}, optional
+        Csv writer to use. Default is 'pyarrow' if it is installed.
     """
     # Normalize csv file path.
-    output_csv = Path(output_csv).with_suffix('.csv')
+    output_csv = Path(output_csv)
+    if output_csv.suffix not in DATAFRAME_FORMATS:
+        output_csv = output_csv.with_suffix('.csv')
+    stem = output_csv.stem
+    kind = output_csv.suffix[1:].upper()
 
     # Check output file existence.
     if output_csv.exists():
-        print('WARNING: CSV FILE EXISTS')
+        print('WARNING:', kind, 'FILE EXISTS')
 
         # Overwrite if it is allowed.
         if overwrite:
-            data_frame.to_csv(output_csv, index=False, mode='w+')
-            print(Path(output_csv).stem, 'CSV FILE OVERWRITTEN')
+            write_dataframe(data_frame, output_csv, engine)
+            print(stem, kind, 'FILE OVERWRITTEN')
 
         # Do not save file is overwrite is not allowed.
         else:
-            print(Path(output_csv).stem, 'CSV FILE NOT SAVED')
+            print(stem, kind, 'FILE NOT SAVED')
 
     # If output file does not exist yet, create it.
     else:
-        data_frame.to_csv(output_csv, index=False, mode='w')
-        print(Path(output_csv).stem, '*** CSV FILE SAVED ***')
+        write_dataframe(data_frame, output_csv, engine)
+        print(stem, '***', kind, 'FILE SAVED ***')
+
+
+def write_csv(data_frame, output_csv, engine=CSV_ENGINE):
+    """Write pandas dataframe to a csv file, without index.
+
+    The Arrow writer is only used for numeric data it writes as pandas
+    does. Other data, or data Arrow fails to convert, is written with
+    pandas.
+
+    Parameters
+    ----------
+    data_frame : pandas DataFrame or dict of numpy arrays
+        To be saved as csv. Dicts are written without building a
+        pandas DataFrame when the Arrow writer is used.
+    output_csv : Path
+        Path of output csv file.
+    engine : {'pyarrow', 'c'}, optional
+        Csv writer to use. Default is 'pyarrow' if it is installed.
+    """
+    if engine == 'pyarrow' and check_arrow_csv_columns(data_frame):
+        try:
+            if isinstance(data_frame, dict):
+                table = pyarrow.table(
+                    {key: pyarrow.array(val, from_pandas=True) for
+                     key, val in data_frame.items()})
+            else:
+                table = pyarrow.Table.from_pandas(data_frame,
+                                                  preserve_index=False)
+        except (pyarrow.lib.ArrowInvalid, pyarrow.lib.ArrowTypeError):
+            pass
+        else:
+            # Write header as pandas does, quoting names only if
+            # needed, then let Arrow write the data rows.
+            header = io.StringIO()
+            csv.writer(header, lineterminator='\n').writerow(
+                [str(name) for name in data_frame.keys()])
+            with open(str(output_csv), 'wb') as file_out:
+                file_out.write(header.getvalue().encode())
+                pyarrow.csv.write_csv(table, file_out,
+                                      pyarrow.csv.WriteOptions(
+                                          include_header=False))
+            return
+    with open(str(output_csv), 'w', buffering=1024 * 1024,
+              newline='') as file_out:
+        pd.DataFrame(data_frame).to_csv(file_out, index=False,
+                                        chunksize=65536,
+                                        lineterminator='\n')
+
+
+def write_dataframe(data_frame, output_path, engine=CSV_ENGINE):
+    """Write pandas dataframe to a file, in the format of its suffix.
+
+    Parameters
+    ----------
+    data_frame : pandas DataFrame or dict of numpy arrays
+        To be saved.
+    output_path : Path
+        Path of output file. Suffix '.parquet' writes snappy compressed
+        parquet, '.feather' writes lz4 compressed feather, and any
+        other writes csv.
+    engine : {'pyarrow', 'c'}, optional
+        Csv writer to use. Default is 'pyarrow' if it is installed.
+    """
+    suffix = Path(output_path).suffix
+    if suffix == '.parquet':
+        pd.DataFrame(data_frame).to_parquet(output_path, index=False,
+                                            compression='snappy')
+    elif suffix == '.feather':
+        pd.DataFrame(data_frame).reset_index(drop=True).to_feather(
+            output_path, compression='lz4')
+    else:
+        write_csv(data_frame, output_path, engine)
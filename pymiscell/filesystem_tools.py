@@ -16,12 +16,29 @@ try:
 except ImportError:
     pass
 import ast
+import copy
 import os
 import shutil
+import time
 
 from . import strings_tools as st
 
 
+# Parsed config files, as path: ((mtime, size), config dict) items,
+# from least to most recently used.
+CONFIG_CACHE = {}
+CONFIG_CACHE_SIZE = 100
+
+# Files names of single folders, as path: (mtime, names tuple) items,
+# from least to most recently used.
+FOLDER_CACHE = {}
+FOLDER_CACHE_SIZE = 100
+
+# Folders modified more recently than this, in seconds, are not cached,
+# since coarse file system timestamps could hide further changes.
+FOLDER_CACHE_MIN_AGE = 2
+
+
 def create_non_existent_folder(folder_path):
     """Create a folder if it does not exist yet.
 
@@ -49,6 +66,9 @@ def create_non_existent_folder(folder_path):
 def extract_config_from_cfg(cfg_path):
     """Extract input data from *.cfg file.
 
+    Results are cached, and only parsed again if the modification time
+    or size of the file change.
+
     Parameters
     ----------
     cfg_path : Path
@@ -59,57 +79,158 @@ def extract_config_from_cfg(cfg_path):
     dict
         Config keywords: python objects pairs.
     """
+    # Return cached result if file did not change since last parse.
+    cache_key = os.path.abspath(str(cfg_path))
+    try:
+        stats = os.stat(cache_key)
+        file_id = (stats.st_mtime_ns, stats.st_size)
+    except OSError:
+        file_id = None
+    cached = CONFIG_CACHE.pop(cache_key, None)
+    if file_id is not None and cached is not None and cached[0] == file_id:
+        CONFIG_CACHE[cache_key] = cached
+        return copy.deepcopy(cached[1])
+
     # Start parser engine and read cfg file.
     cfg = configparser.ConfigParser()
     cfg.read(cfg_path)
 
     # Gather all input variables and merge them in one dict.
-    input_data = ({k.lower(): v for k, v in cfg.items(i)}
-                  for i in cfg.sections())
-    config_dict = {}
-    for i in input_data:
-        config_dict.update(i)
+    config_dict = {k.lower(): v for i in cfg.sections()
+                   for k, v in cfg.items(i)}
 
     # Try to convert variables to Python objects.
     output_data = {}
     for k, value in config_dict.items():
         try:
             output_data[k] = ast.literal_eval(value)
-        except SyntaxError:
-            output_data[k] = value
-        except TypeError:
+        except (SyntaxError, TypeError, ValueError):
             output_data[k] = value
+
+    # Cache a deep copy of result, so mutable values returned to
+    # callers are not shared with it. Evict least recently used files
+    # if full.
+    if file_id is not None:
+        CONFIG_CACHE[cache_key] = (file_id, copy.deepcopy(output_data))
+        while len(CONFIG_CACHE) > CONFIG_CACHE_SIZE:
+            del CONFIG_CACHE[next(iter(CONFIG_CACHE))]
     return output_data
 
 
-def find_file(root_path, searched_file, recursively=False):
+def find_file(root_path, searched_file, recursively=False,
+              first_only=False):
     """Find instances of file, searching in a folder system.
 
     Parameters
     ----------
     root_path : Path
         Top level folder, start search here.
-    searched_file : str
-        Name of searched file.
+    searched_file : str or list of str
+        Name, or names, of searched file.
     recursively : bool, optional
         If True, search folders recursively. Default is False.
+    first_only : bool, optional
+        If True, stop searching at the first instance found and return
+        its Path. Default is False.
 
     Returns
     -------
     list
         Full Paths of `searched_file` instances.
+    Path
+        Full Path of first `searched_file` instance, if `first_only`.
     False
         If file is not found.
     """
-    # List all files in root and extract searched file path.
-    paths_list = list_files(root_path, True, recursively)
-    file_path = [i for i in paths_list if str(i.name) == searched_file]
+    # List files in root matching searched file names, stopping at the
+    # first one if requested.
+    if isinstance(searched_file, str):
+        searched_file = [searched_file]
+    predicate = frozenset(searched_file).__contains__
+    if first_only:
+        entry = next(generate_files_walker(root_path, recursively,
+                                           predicate), None)
+        file_path = Path(entry.path) if entry is not None else None
+    else:
+        file_path = list_files(root_path, True, recursively, predicate)
     if not file_path:
         print('File not found')
         return False
     return file_path
 
 
+def generate_files(root_path, full_path=True, recursively=True,
+                   predicate=None):
+    """Create generator that yields files paths in a folder, unsorted.
+
+    Unlike `list_files`, paths are produced while the folder is being
+    walked, so no list of all files is ever built.
+
+    Parameters
+    ----------
+    root_path : Path
+        Top level folder, start search here.
+    full_path : bool, optional
+        If True, yield Full Path of files, instead of just files names.
+    recursively : bool, optional
+        If True, search folders recursively. Default is True.
+    predicate : callable, optional
+        If given, only yield files whose name makes it return True.
+
+    Yields
+    ------
+    Path or str
+        Paths, or names, of found files.
+    """
+    for entry in generate_files_walker(root_path, recursively, predicate):
+        yield Path(entry.path) if full_path else entry.name
+
+
+def generate_files_walker(root_path, recursively=True, predicate=None):
+    """Create generator that yields files entries found in a folder.
+
+    Parameters
+    ----------
+    root_path : Path
+        Top level folder, start search here.
+    recursively : bool, optional
+        If True, search folders recursively. Default is True.
+    predicate : callable, optional
+        If given, only yield files whose name makes it return True.
+
+    Yields
+    ------
+    os.DirEntry
+        Entries of found files.
+
+    Raises
+    ------
+    OSError
+        `root_path` can not be read.
+    """
+    # Walk folders iteratively, keeping pending sub-folders in a stack
+    # instead of recursing into nested generators. Skip sub-folders
+    # that can not be read or disappeared during the walk, as os.walk
+    # does, but report errors on the root folder.
+    root_path = str(root_path)
+    folders = [root_path]
+    while folders:
+        folder = folders.pop()
+        try:
+            entries = os.scandir(folder)
+        except OSError:
+            if folder == root_path:
+                raise
+            continue
+        with entries:
+            for entry in entries:
+                if entry.is_file():
+                    if predicate is None or predicate(entry.name):
+                        yield entry
+                elif recursively and entry.is_dir(follow_symlinks=False):
+                    folders.append(entry.path)
+
+
 def generate_folder_walker(root_path, level=1):
     """Create generator that walks a folder recursively.
 
@@ -125,17 +246,37 @@ def generate_folder_walker(root_path, level=1):
     Path
         Paths of accessed folders.
     """
-    root_path = root_path.rstrip(os.path.sep)
+    root_path = str(root_path).rstrip(os.path.sep)
     assert os.path.isdir(root_path)
-    num_sep = root_path.count(os.path.sep)
-    for root, dirs, files in os.walk(root_path):
+
+    # Walk top-down like os.walk, keeping each folder depth in the
+    # stack. Sub-folders are only entered below `level` depth, and
+    # callers may prune `dirs` in place as with os.walk.
+    folders = [(root_path, 0)]
+    while folders:
+        root, depth = folders.pop()
+        dirs, files, links = [], [], set()
+        try:
+            with os.scandir(root) as entries:
+                for entry in entries:
+                    if entry.is_dir():
+                        dirs.append(entry.name)
+                        if entry.is_symlink():
+                            links.add(entry.name)
+                    else:
+                        files.append(entry.name)
+        except OSError:
+            continue
         yield root, dirs, files
-        num_sep_this = root.count(os.path.sep)
-        if num_sep + level <= num_sep_this:
-            del dirs[:]
 
+        # Like os.walk, list linked folders but do not walk into them.
+        if depth < level:
+            folders.extend((os.path.join(root, i), depth + 1)
+                           for i in reversed(dirs) if i not in links)
 
-def list_files(root_path, full_path=True, recursively=True):
+
+def list_files(root_path, full_path=True, recursively=True,
+               predicate=None, sort=True):
     """List all files paths in a folder.
 
     Parameters
@@ -146,58 +287,81 @@ def list_files(root_path, full_path=True, recursively=True):
         If True, gets Full Path of files, instead of just files names.
     recursively : bool, optional
         If True, search folders recursively. Default is False.
+    predicate : callable, optional
+        If given, only list files whose name makes it return True.
+    sort : bool, optional
+        If True, try to sort files by the digits in them. Otherwise,
+        keep folder scanning order. Default is True.
 
     Returns
     -------
     List
         Paths of all existing files.
     """
-    root_path = Path(root_path)
-
-    # List files with or without recursion.
-    if recursively:
-        paths_list = [f for f in root_path.rglob("*") if f.is_file()]
+    # List files with or without recursion. Entries already hold their
+    # joined path string, so keep strings until sorting is done.
+    #
+    # Single folders listings are served from cache when possible.
+    if not recursively:
+        names = [i for i in list_folder_files(root_path)
+                 if predicate is None or predicate(i)]
+        if full_path:
+            paths_list = [os.path.join(str(root_path), i) for i in names]
+        else:
+            paths_list = names
     else:
-        paths_list = [f for f in root_path.iterdir() if f.is_file()]
-    if not full_path:
-        paths_list = [f.name for f in paths_list]
+        entries = generate_files_walker(root_path, recursively, predicate)
+        if full_path:
+            paths_list = [f.path for f in entries]
+        else:
+            paths_list = [f.name for f in entries]
 
-    # Try to sort files by digits
-    try:
-        return st.sort_strings_by_digit(paths_list)
-    except IndexError:
-        return paths_list
+    # Try to sort files by digits, on path strings rather than Paths.
+    if sort:
+        paths_list = st.sort_strings_by_digit(paths_list)
+    if full_path:
+        paths_list = [Path(f) for f in paths_list]
+    return paths_list
 
 
 def list_files_with_extension(root_path, extension, full_path=True,
-                              recursively=True):
-    """List all files paths in a folder, filtered by a given suffix.
+                              recursively=True, sort=True):
+    """List all files paths in a folder, filtered by given suffixes.
 
     Parameters
     ----------
     root_path : Path
         Top level folder, start search here.
-    extension : str
-        Extension of files to list.
+    extension : str or list of str
+        Extension, or extensions, of files to list. Matching is not
+        case sensitive.
     full_path : bool, optional
         If True, gets Full Path of files, instead of just files names.
     recursively : bool, optional
         If True, search folders recursively. Default is False.
+    sort : bool, optional
+        If True, try to sort files by the digits in them. Default is
+        True.
 
     Returns
     -------
     List
         Paths of filtered files.
     """
-    # List all files in root and filter them by extension.
-    paths_list = list_files(root_path, full_path, recursively)
-    paths_list = [i for i in paths_list if
-                  i.suffix == '.' + extension.replace('.', '')]
-    return paths_list
+    # Normalize extensions once to a tuple of lower case suffixes, so
+    # they are all checked in a single endswith call. Only leading dots
+    # are stripped, to keep multi-part extensions such as 'tar.gz'.
+    if isinstance(extension, str):
+        extension = [extension]
+    suffixes = tuple('.' + i.lstrip('.').lower() for i in extension)
+
+    # List files in root, filtering them by extension while walking.
+    return list_files(root_path, full_path, recursively,
+                      lambda name: name.lower().endswith(suffixes), sort)
 
 
 def list_files_with_substring(root_path, input_string, full_path=True,
-                              recursively=True):
+                              recursively=True, sort=True):
     """List all files paths in a folder, filtered by given substring.
 
     Parameters
@@ -210,16 +374,53 @@ def list_files_with_substring(root_path, input_string, full_path=True,
         If True, gets Full Path of files, instead of just files names.
     recursively : bool, optional
         If True, search folders recursively. Default is False.
+    sort : bool, optional
+        If True, try to sort files by the digits in them. Default is
+        True.
 
     Returns
     -------
     List
         Paths of filtered files.
     """
-    # List all files in root and filter them by substring.
-    paths_list = list_files(root_path, full_path, recursively)
-    paths_list = [i for i in paths_list if input_string in i.name]
-    return paths_list
+    # List files in root, filtering them by substring while walking.
+    return list_files(root_path, full_path, recursively,
+                      lambda name: input_string in name, sort)
+
+
+def list_folder_files(folder_path):
+    """List names of files in a folder, without recursion.
+
+    Results are cached, and only listed again if the modification time
+    of the folder changes, which happens whenever files are added,
+    removed or renamed in it.
+
+    Parameters
+    ----------
+    folder_path : Path
+        Folder to list files from.
+
+    Returns
+    -------
+    list of str
+        Names of files in folder.
+    """
+    # Return cached names if folder did not change since last listing.
+    cache_key = os.path.abspath(str(folder_path))
+    mtime = os.stat(cache_key).st_mtime_ns
+    cached = FOLDER_CACHE.pop(cache_key, None)
+    if cached is not None and cached[0] == mtime:
+        FOLDER_CACHE[cache_key] = cached
+        return list(cached[1])
+
+    # List folder and cache result, unless it was just modified. Evict
+    # least recently used folders if full.
+    names = [f.name for f in generate_files_walker(cache_key, False)]
+    if time.time() - mtime / 1e9 > FOLDER_CACHE_MIN_AGE:
+        FOLDER_CACHE[cache_key] = (mtime, tuple(names))
+        while len(FOLDER_CACHE) > FOLDER_CACHE_SIZE:
+            del FOLDER_CACHE[next(iter(FOLDER_CACHE))]
+    return names
 
 
 def manage_old_version_file(file_path):
@@ -248,17 +449,19 @@ def manage_old_version_file(file_path):
 
     # If old version exists, create a copy without prefix and return
     # that path. If not, create a copy with prefix and set it as the
-    # new backup file.
+    # new backup file. Only contents are copied, since metadata is not
+    # needed for the backup. Hard links are not an option, since the
+    # returned file is meant to be modified.
     if old_version_file.exists():
-        shutil.copy(str(old_version_file), str(file_path))
+        shutil.copyfile(str(old_version_file), str(file_path))
         output = file_path
-    elif Path(file_path).exists():
-        shutil.copy(file_path, old_version_file)
+    elif file_path.exists():
+        shutil.copyfile(str(file_path), str(old_version_file))
         output = file_path
 
     # Report if no file was found
     else:
-        print(Path(file_path).name, 'FILE NOT FOUND IN', str(file_path.parent))
+        print(file_path.name, 'FILE NOT FOUND IN', str(file_path.parent))
         output = None
     return output
 
@@ -315,19 +518,129 @@ def renumber_file(file_path, delta):
     -------
     Path
         Full Path of new file name.
+
+    Raises
+    ------
+    IndexError
+        No digits found in file name.
+    FileExistsError
+        Another file with the new name already exists.
     """
-    # Normalize input to Path object and extract original number
+    # Build new file name, check it is free and rename file atomically.
     file_path = Path(file_path)
-    number = st.extract_number_from_str(file_path)
-
-    # Rename file
-    output_path = str(file_path).replace(str(number), str(number + delta))
-    file_path.rename(output_path)
+    output_path = renumber_path(file_path, delta)[1]
+    if output_path != file_path and output_path.exists():
+        raise FileExistsError('File already exists: ' + str(output_path))
+    file_path.replace(output_path)
     return output_path
 
 
+def renumber_files(files_list, delta):
+    """Modify files names adding a number to the last digit in them.
+
+    All new names are computed first. Files are then renamed starting
+    from the highest numbers if `delta` is positive, or from the lowest
+    ones otherwise, so a file in a consecutive series is never renamed
+    over another file of the series that is still to be renamed.
+
+    Parameters
+    ----------
+    files_list : list of Paths
+        Paths of files to be renamed.
+    delta : int
+        Number to be add to the last digit found in files names.
+
+    Returns
+    -------
+    list of Paths
+        Full Paths of new files names, in input order.
+
+    Raises
+    ------
+    IndexError
+        No digits found in a file name.
+    ValueError
+        A file appears more than once in `files_list`.
+    FileExistsError
+        Two files would get the same new name, or a new name belongs
+        to an existing file not in `files_list`.
+
+    No file is renamed if any error is raised.
+    """
+    # Precompute original numbers and new paths for all files.
+    renames = []
+    for file_path in files_list:
+        number, output_path = renumber_path(file_path, delta)
+        renames.append((number, Path(file_path), output_path))
+
+    # Check files are listed once and get different new names.
+    sources = {os.path.abspath(str(i[1])) for i in renames}
+    if len(sources) < len(renames):
+        raise ValueError('Files listed more than once')
+    targets = set()
+    for _, _, output_path in renames:
+        target = os.path.abspath(str(output_path))
+        if target in targets:
+            raise FileExistsError('New name repeated: ' + str(output_path))
+        targets.add(target)
+
+    # Check no file outside the series would be overwritten.
+    for _, _, output_path in renames:
+        if os.path.abspath(str(output_path)) not in sources and \
+                output_path.exists():
+            raise FileExistsError('File already exists: ' +
+                                  str(output_path))
+
+    # Rename files in collision free order.
+    for _, file_path, output_path in sorted(renames, key=lambda x: x[0],
+                                            reverse=delta > 0):
+        file_path.replace(output_path)
+    return [i[2] for i in renames]
+
+
+def renumber_path(file_path, delta):
+    """Build a file path adding a number to the last digit in its name.
+
+    The file suffix is not searched for digits.
+
+    Parameters
+    ----------
+    file_path : Path
+        Path of file to be renumbered.
+    delta : int
+        Number to be add to the last digit found in file name.
+
+    Returns
+    -------
+    int
+        Original number found in file name.
+    Path
+        Full Path of new file name.
+
+    Raises
+    ------
+    IndexError
+        No digits found in file name.
+    """
+    # Normalize input to Path object and locate last number in name,
+    # leaving out the suffix, which may contain digits ('.mp4', '.h5').
+    file_path = Path(file_path)
+    file_stem = file_path.stem
+    match = st.search_last_number(file_stem)
+    if match is None:
+        raise IndexError('No digits found in file name')
+
+    # Replace only that number.
+    number = int(match.group())
+    output_path = file_path.with_name(file_stem[:match.start()] +
+                                      str(number + delta) +
+                                      file_stem[match.end():] +
+                                      file_path.suffix)
+    return number, output_path
+
+
 def save_files_list_2txt(root_path, txt_path=None, full_path=False,
-                         recursively=False):
+                         recursively=False, sort=True):
     """Save all files paths in a folder to a txt file.
 
     Parameters
@@ -340,6 +653,10 @@ def save_files_list_2txt(root_path, txt_path=None, full_path=False,
         If True, gets Full Path of files, instead of just files names.
     recursively : bool, optional
         If True, search folders recursively. Default is False.
+    sort : bool, optional
+        If True, sort files by the digits in them. Otherwise, write
+        files while walking the folder, without listing them in memory.
+        Default is True.
 
     Returns
     -------
@@ -349,18 +666,32 @@ def save_files_list_2txt(root_path, txt_path=None, full_path=False,
     # Set default output file and normalize input suffix
     if not txt_path:
         txt_path = Path(root_path, 'files_list')
-    txt_path = txt_path.with_suffix('.txt')
-
-    # List all files in root and save to output txt
-    paths_list = list_files(root_path, full_path, recursively)
-    with open(txt_path, 'w+') as file_out:
-        file_out.write('\n'.join(paths_list))
+    txt_path = Path(txt_path).with_suffix('.txt')
+
+    # List all files in root and save to output txt, one per line,
+    # through a large write buffer. Unsorted files are streamed from
+    # the walker, skipping the output txt itself.
+    paths_list = None
+    if sort:
+        paths_list = list_files(root_path, full_path, recursively)
+    with open(str(txt_path), 'w', buffering=1024 * 1024) as file_out:
+        if paths_list is None:
+            txt_inode = os.fstat(file_out.fileno()).st_ino
+            entries = (i for i in generate_files_walker(root_path,
+                                                        recursively)
+                       if i.inode() != txt_inode or
+                       not os.path.samefile(i.path, str(txt_path)))
+            paths_list = (i.path if full_path else i.name for i in entries)
+        file_out.writelines(str(i) + '\n' for i in paths_list)
     return txt_path
 
 
 def size_folder(root_path=None, recursively=True):
     """Calculate the size of a given folder in MB.
 
+    Symbolic links count with their own size, so linked files are not
+    counted twice.
+
     Parameters
     ----------
     root_path : Path, optional
@@ -373,8 +704,11 @@ def size_folder(root_path=None, recursively=True):
     float
         Size of folder in MB.
     """
-    # List all files in root folder and sum their stats
+    # Walk files in root folder and sum their sizes. Not following
+    # links lets the stat be served from the folder entries cache where
+    # the platform provides it (Windows).
     if root_path is None:
         root_path = Path.cwd()
-    paths_list = list_files(root_path, True, recursively)
-    return round(sum(f.stat().st_size for f in paths_list) / (1024*1024), 3)
+    entries = generate_files_walker(root_path, recursively)
+    total = sum(f.stat(follow_symlinks=False).st_size for f in entries)
+    return round(total / (1024*1024), 3)
@@ -7,6 +7,13 @@ https://github.com/rodrigo1392
 """
 
 import requests
+from requests.adapters import HTTPAdapter
+
+
+# Persistent session, reusing connections to Telegram across messages.
+TELEGRAM_SESSION = requests.Session()
+TELEGRAM_SESSION.mount('https://', HTTPAdapter(pool_connections=4,
+                                               pool_maxsize=16))
 
 
 def send_message_2telegram_bot(bot_token, bot_chat_id, bot_message):
@@ -26,8 +33,9 @@ def send_message_2telegram_bot(bot_token, bot_chat_id, bot_message):
     json
         Details of the telegram message object.
     """
-    send_text = 'https://api.telegram.org/bot' + bot_token +\
-                '/sendMessage?chat_id=' + bot_chat_id + \
-                '&parse_mode=Markdown&text=' + bot_message
-    response = requests.get(send_text)
+    send_url = 'https://api.telegram.org/bot' + bot_token + '/sendMessage'
+    params = {'chat_id': bot_chat_id,
+              'parse_mode': 'Markdown',
+              'text': bot_message}
+    response = TELEGRAM_SESSION.get(send_url, params=params, timeout=10)
     return response.json()
@@ -7,15 +7,28 @@ https://github.com/rodrigo1392
 """
 
 import math
+from functools import lru_cache
 
 import matplotlib.pyplot as plt
 import numpy as np
 import sympy as sp
 
-from IPython.display import display
 from scipy.interpolate import Akima1DInterpolator
 from sympy.solvers.solveset import nonlinsolve, linsolve
 
+# Show rich solutions in IPython sessions, print them otherwise.
+try:
+    from IPython.display import display
+except ImportError:
+    display = print
+
+# Fuse element-wise kernels into single compiled loops when numba is
+# available, otherwise fall back to numpy expressions.
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+
 
 SI_CONSTANTS = {'gravity': 9.80665,  # in m/s2
                 }
@@ -24,6 +37,50 @@ CONVERT_FACTORS = {'N-kgf': SI_CONSTANTS['gravity'],
                        100 / SI_CONSTANTS['gravity'],
                    'kg/m3-kg/cm3': (1 / 1000000),
                    }
+INVERSE_CONVERT_FACTORS = {key: 1 / val for
+                           key, val in CONVERT_FACTORS.items()}
+
+# Default PCG64 random generator for sampling functions.
+RANDOM_GENERATOR = np.random.default_rng()
+
+
+if njit is not None:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def ishigami_kernel(x_1, x_2, x_3, output):
+        """Evaluate Ishigami function in one pass over the inputs."""
+        for i in prange(x_1.shape[0]):
+            sin_1 = math.sin(x_1[i])
+            sin_2 = math.sin(x_2[i])
+            x_3_2 = x_3[i] * x_3[i]
+            output[i] = sin_1 + 7.0 * sin_2 * sin_2 + \
+                0.1 * x_3_2 * x_3_2 * sin_1
+
+    @njit(fastmath=True, cache=True)
+    def trapezoid_kernel(independent, dependent):
+        """Integrate with the trapezoidal rule without temporaries."""
+        total = 0.0
+        for i in range(1, independent.shape[0]):
+            total += (independent[i] - independent[i - 1]) * \
+                (dependent[i] + dependent[i - 1])
+        return 0.5 * total
+
+
+@lru_cache(maxsize=16)
+def build_akima_interpolator(independent_bytes, dependent_bytes):
+    """Build an Akima interpolator from raw float arrays, cached.
+
+    Parameters
+    ----------
+    independent_bytes, dependent_bytes : bytes
+        Raw float64 data of independent and dependent variables.
+
+    Returns
+    -------
+    scipy Akima1DInterpolator
+        Interpolator of the given function.
+    """
+    return Akima1DInterpolator(np.frombuffer(independent_bytes),
+                               np.frombuffer(dependent_bytes))
 
 
 def check_array_consecutiveness(array_like):
@@ -47,34 +104,38 @@ def check_array_consecutiveness(array_like):
     AssertionError
         Not numeric data in `array_like`.
     """
-    # Normalize input to numpy array object and flatten it.
-    array = np.asarray(array_like)
-    array = array.flatten()
+    # Normalize input to a flat numpy array copy and sort it in place.
+    array = np.array(array_like).ravel()
     assert array.dtype.kind not in {'U', 'S'}, \
         'Array should contain numeric data only'
+    array.sort()
 
     # Check for not consecutive values and gather their positions.
-    array_diff = np.diff(sorted(array))
-    bool_consecutiveness = sum(array_diff == 1) >= len(array) - 1
-    fail_positions = np.argwhere(np.diff(sorted(array)) > 1) + 2
+    array_diff = np.diff(array)
+    bool_consecutiveness = bool(
+        np.count_nonzero(array_diff == 1) >= array.size - 1)
+    fail_positions = np.argwhere(array_diff > 1) + 2
     return bool_consecutiveness, fail_positions
 
 
-def convert_units(quantity, conversion, inverse=False):
-    """Convert float from a physical unit to another.
+def convert_units(quantity, conversion, inverse=False, out=None):
+    """Convert float or array from a physical unit to another.
 
     Parameters
     ----------
-    quantity : float
-        Physical magnitude value to be converted.
+    quantity : float or numpy array
+        Physical magnitude value(s) to be converted.
     conversion : string from `CONVERT_FACTORS` dictionary
         Determines from and to which measurement unit to convert.
     inverse : Boolean
         If True, perform the inverse conversion. Default is False.
+    out : numpy array, optional
+        If given, store converted values in this array, which may be
+        `quantity` itself. Default is None.
 
     Returns
     -------
-    float
+    float or numpy array
         Physical quantity in new measure unit.
 
     Raises
@@ -82,14 +143,13 @@ def convert_units(quantity, conversion, inverse=False):
     AssertionError
         Conversion factor not established `CONVERT_FACTORS` dictionary.
     """
-    assert conversion in CONVERT_FACTORS.keys(),\
-        'Conversion factor not defined'
-
-    if not inverse:
-        converted = quantity * CONVERT_FACTORS[conversion]
-    else:
-        converted = quantity * (1 / CONVERT_FACTORS[conversion])
-    return converted
+    # Look up factor, reciprocals are precomputed for inverse ones.
+    factor = (INVERSE_CONVERT_FACTORS if inverse else
+              CONVERT_FACTORS).get(conversion)
+    assert factor is not None, 'Conversion factor not defined'
+    if out is not None:
+        return np.multiply(quantity, factor, out=out)
+    return quantity * factor
 
 
 def eval_sympy(expression, substitute_dict):
@@ -107,13 +167,11 @@ def eval_sympy(expression, substitute_dict):
     sympy object
         Evaluated algebraic expression.
     """
-    # Attempt a symbolic eval, check for expression changes, return when
-    # no more changes occur.
-    for _ in range(0, len(substitute_dict) + 1):
-        new_expr = expression.subs(substitute_dict)
-        if new_expr == expression:
-            break
-    return new_expr
+    # Normalize substitutions to sympy objects for exact node matching,
+    # use them as a hashable key for cached substitutions.
+    substitutions = frozenset((sp.sympify(key), sp.sympify(val)) for
+                              key, val in substitute_dict.items())
+    return substitute_sympy(sp.sympify(expression), substitutions)
 
 
 def extract_unique_sub_arrays(array_like):
@@ -127,7 +185,8 @@ def extract_unique_sub_arrays(array_like):
     Returns
     -------
     numpy array
-        Input array with unique sub-arrays.
+        Input array with unique sub-arrays, in order of first
+        appearance.
 
     Raises
     ------
@@ -138,12 +197,14 @@ def extract_unique_sub_arrays(array_like):
     array = np.asarray(array_like)
     assert array.ndim >= 2, 'Array should be mulidimensional'
 
-    # Deal with data types, store array efficiently and filter unique.
-    types = np.dtype((np.void, array.dtype.itemsize *
-                      np.prod(array.shape[1:])))
-    contiguous = np.ascontiguousarray(array.reshape(array.shape[0],
-                                                    -1)).view(types)
-    return array[np.unique(contiguous, return_index=True)[1]]
+    # Hash flattened sub-arrays as raw bytes, keep index of first
+    # appearance of each one.
+    flat = np.ascontiguousarray(array.reshape(array.shape[0], -1))
+    types = np.dtype((np.void, flat.dtype.itemsize * flat.shape[1]))
+    first_indexes = {}
+    for index, row in enumerate(flat.view(types).ravel().tolist()):
+        first_indexes.setdefault(row, index)
+    return array[list(first_indexes.values())]
 
 
 def generate_primes(amount):
@@ -159,21 +220,18 @@ def generate_primes(amount):
     list
         Prime numbers.
     """
-    # Set first prime and first candidate for generator.
-    output_list = [2]
-    number = 3
-
-    # Generate candidates, test primeness and append them if positive.
-    while len(output_list) < amount:
-        primeness = True
-        for num in range(2, int(number ** 0.5) + 1):
-            if number % num == 0:
-                primeness = False
-                break
-        if primeness:
-            output_list.append(number)
-        number += 1
-    return output_list
+    if amount < 1:
+        return []
+
+    # Size sieve with the prime counting bound and grow it until enough
+    # primes are found.
+    upper = max(15, int(amount * (math.log(amount) +
+                                  math.log(math.log(amount + 3)))) + 10)
+    while True:
+        primes = sieve_primes(upper)
+        if primes.size >= amount:
+            return primes[:amount].tolist()
+        upper *= 2
 
 
 def generate_primes_to(limit):
@@ -189,19 +247,15 @@ def generate_primes_to(limit):
     list
         Prime numbers.
     """
-    # Move up python limit for generator.
-    limit = limit + 1
-
-    # Generate candidates, try for and mark composites numbers.
-    prime = [True] * limit
-    for number in range(2, limit):
-        if prime[number]:
-            yield number
-            for _ in range(number * number, limit, number):
-                prime[_] = False
+    # Convert sieved primes to Python ints in chunks, so they are not
+    # all held as Python objects at once.
+    primes = sieve_primes(limit)
+    for start in range(0, primes.size, 65536):
+        yield from primes[start:start + 65536].tolist()
 
 
-def generate_white_noise(mean, std, num_samples):
+def generate_white_noise(mean, std, num_samples, rng=None,
+                         dtype=np.float64, out=None):
     """Generate normalized random values.
 
     Parameters
@@ -212,13 +266,30 @@ def generate_white_noise(mean, std, num_samples):
         Standard deviation of output samples.
     num_samples : int
         Amount of output samples.
+    rng : numpy Generator, optional
+        Random generator to draw samples from, for reproducible
+        results. Default is None, which uses `RANDOM_GENERATOR`.
+    dtype : numpy float32 or float64, optional
+        Data type of output samples. Default is float64.
+    out : numpy array, optional
+        If given, fill this float array with the samples instead of
+        allocating a new one. `num_samples` and `dtype` are then taken
+        from it. Default is None.
 
     Returns
     -------
     numpy array
         Numeric samples.
     """
-    return np.random.normal(mean, std, size=num_samples)
+    # Draw standard normal samples, scale and shift them in place.
+    rng = RANDOM_GENERATOR if rng is None else rng
+    if out is None:
+        samples = rng.standard_normal(num_samples, dtype=dtype)
+    else:
+        samples = rng.standard_normal(dtype=out.dtype, out=out)
+    samples *= std
+    samples += mean
+    return samples
 
 
 def integrate_num_2d(independent, dependent, verbose=False):
@@ -248,7 +319,16 @@ def integrate_num_2d(independent, dependent, verbose=False):
     """
     assert independent.shape == dependent.shape,\
         'Independent and dependent variables arrays should be consistent'
-    integral = np.trapz(independent, dependent)
+
+    # Integrate with the trapezoidal rule, with a compiled loop if
+    # possible or a single dot product otherwise.
+    independent = np.ravel(np.asarray(independent, dtype=float))
+    dependent = np.ravel(np.asarray(dependent, dtype=float))
+    if njit is not None:
+        integral = trapezoid_kernel(independent, dependent)
+    else:
+        integral = 0.5 * np.dot(np.diff(independent),
+                                dependent[1:] + dependent[:-1])
     plt.plot(independent, dependent, markersize=5, marker='o')
     plt.show()
     if verbose:
@@ -256,8 +336,9 @@ def integrate_num_2d(independent, dependent, verbose=False):
     return integral
 
 
-def interpolate_2d(independent, dependent, plot=True):
-    """Interpolate a one variable function with the Akima algorithm.
+def interpolate_2d(independent, dependent, plot=True, method='akima',
+                   num=10000):
+    """Interpolate a one variable function.
 
     Parameters
     ----------
@@ -267,6 +348,11 @@ def interpolate_2d(independent, dependent, plot=True):
         Dependent variable values.
     plot : bool, optional
         If True, plot original vs interpolated curves. Default is False.
+    method : {'akima', 'linear'}, optional
+        Interpolation algorithm. 'akima' gives a smooth curve, 'linear'
+        is faster. Default is 'akima'.
+    num : int, optional
+        Amount of interpolated samples. Default is 10000.
 
     Returns
     -------
@@ -278,18 +364,26 @@ def interpolate_2d(independent, dependent, plot=True):
     Raises
     ------
     AssertionError
-        `x` and `y` arrays have different dimensions.
+        `x` and `y` arrays have different dimensions, or `method` is
+        not supported.
     """
     assert independent.shape == dependent.shape,\
         'Independent and dependent variables arrays should be consistent'
+    assert method in {'akima', 'linear'},\
+        'Interpolation method should be akima or linear'
 
-    # Start interpolator, re-sample independent values, calculate
-    # interpolated dependent values.
-    interpolator = Akima1DInterpolator(independent, dependent)
+    # Re-sample independent values, calculate interpolated dependent
+    # values.
     new_independent = np.linspace(np.amin(independent),
                                   np.amax(np.asarray(independent)),
-                                  10000)
-    new_dependent = interpolator(new_independent)
+                                  num)
+    if method == 'linear':
+        new_dependent = np.interp(new_independent, independent, dependent)
+    else:
+        interpolator = build_akima_interpolator(
+            np.ascontiguousarray(independent, dtype=float).tobytes(),
+            np.ascontiguousarray(dependent, dtype=float).tobytes())
+        new_dependent = interpolator(new_independent)
     if plot:
         fig = plt.figure(figsize=(10, 8))
         axes = fig.add_subplot(111)
@@ -299,19 +393,28 @@ def interpolate_2d(independent, dependent, plot=True):
     return new_independent, new_dependent
 
 
-def ishigami_eq(x_1, x_2, x_3):
+def ishigami_eq(x_1, x_2, x_3, out=None):
     """Mathematical Ishigami function of three variables.
 
     Parameters
     ----------
     x_1, x_2, x_3 : numpy arrays
         Input independent variables.
+    out : numpy array, optional
+        If given, C contiguous float array of the broadcast inputs
+        shape to store the output in. It may be one of the inputs.
+        Default is None.
 
     Returns
     -------
     numpy array
         Dependent variable.
 
+    Raises
+    ------
+    AssertionError
+        `out` array has wrong shape or is not C contiguous.
+
     Notes
     -----
     The Ishigami function of Ishigami & Homma (1990) is used as a test
@@ -320,7 +423,31 @@ def ishigami_eq(x_1, x_2, x_3):
     It also has a peculiar dependence on x_3, as described by Sobol
     & Levitan (1999).
     """
-    return np.sin(x_1) + 7 * np.sin(x_2) ** 2 + 0.1 * x_3 ** 4 * np.sin(x_1)
+    # Normalize inputs and output buffer.
+    x_1, x_2, x_3 = np.broadcast_arrays(*(np.asarray(i, dtype=float) for
+                                          i in (x_1, x_2, x_3)))
+    output = np.empty(x_1.shape) if out is None else out
+    assert output.shape == x_1.shape and output.flags.c_contiguous, \
+        'Output array should be C contiguous and match inputs shape'
+
+    # Run fused kernel over flat float arrays if possible. Otherwise,
+    # reuse temporaries with in place numpy operations, reading all
+    # inputs before the output is written.
+    if njit is not None:
+        ishigami_kernel(np.ravel(x_1), np.ravel(x_2), np.ravel(x_3),
+                        output.reshape(-1))
+    else:
+        sin_1 = np.sin(x_1, out=np.empty(x_1.shape))
+        x_3_term = np.square(x_3, out=np.empty(x_1.shape))
+        np.square(x_3_term, out=x_3_term)
+        x_3_term *= 0.1
+        x_3_term += 1
+        x_3_term *= sin_1
+        np.sin(x_2, out=output)
+        np.square(output, out=output)
+        output *= 7
+        output += x_3_term
+    return output if output.ndim else output[()]
 
 
 def round_down_n(input_f, base=5):
@@ -328,16 +455,20 @@ def round_down_n(input_f, base=5):
 
     Parameters
     ----------
-    input_f : float
-        Value to be rounded.
+    input_f : float or numpy array
+        Value(s) to be rounded.
     base: int
         Multiple of which to round down to.
 
     Returns
     -------
-    int
-        Rounded number.
+    int or numpy array
+        Rounded number(s).
     """
+    if isinstance(input_f, np.ndarray):
+        return np.floor(input_f / base).astype(np.int64) * base
+    if isinstance(input_f, int):
+        return input_f // base * base
     return int(math.floor(input_f / base)) * base
 
 
@@ -346,54 +477,116 @@ def round_up_n(input_f, base=5):
 
     Parameters
     ----------
-    input_f : float
-        Value to be rounded.
+    input_f : float or numpy array
+        Value(s) to be rounded.
     base: int
         Multiple of which to round up to.
 
     Returns
     -------
-    int
-        Rounded number.
+    int or numpy array
+        Rounded number(s).
     """
+    if isinstance(input_f, np.ndarray):
+        return np.ceil(input_f / base).astype(np.int64) * base
+    if isinstance(input_f, int):
+        return -(-input_f // base) * base
     return int(math.ceil(input_f / base)) * base
 
 
-def solve_equations_system(variables, equations, replace_values=None):
-    """Solve linear and non linear equations system using Sympy library.
+def sieve_primes(limit):
+    """Sieve all prime numbers, up to a given number.
 
     Parameters
     ----------
-    variables : list of str
+    limit : int
+        Upper limit of sieved primes.
+
+    Returns
+    -------
+    numpy array
+        Prime numbers.
+    """
+    if limit < 2:
+        return np.empty(0, dtype=np.int64)
+
+    # Sieve odd numbers only, index i stands for number 2i + 1, and
+    # strike out odd multiples starting from each prime squared.
+    size = (limit - 1) // 2
+    sieve = np.ones(size + 1, dtype=bool)
+    sieve[0] = False
+    for index in range(1, (int(limit ** 0.5) - 1) // 2 + 1):
+        if sieve[index]:
+            step = 2 * index + 1
+            sieve[2 * index * (index + 1)::step] = False
+
+    # Prepend the only even prime to surviving odd numbers.
+    return np.insert(2 * np.flatnonzero(sieve) + 1, 0, 2)
+
+
+@lru_cache(maxsize=64)
+def solve_equations_symbolically(variables, equations):
+    """Solve linear and non linear equations system symbolically, cached.
+
+    Parameters
+    ----------
+    variables : tuple of str
         Name of independent variable to solve for.
-    equations : list of sympy equations objects
-        Conform the equations system.
-    replace_values : dict, optional
-        If given, substitute variables for numeric values established
-        in dict, as variable name:value pairs. Default is None.
+    equations : tuple of sympy equations objects
+        Conform the equations system, matrices should be immutable.
 
     Returns
     -------
     dict
-        Variable name: Solution value pairs.
+        Variable name: Solution expression pairs, empty if the system
+        has no solution.
     """
     # If a Matrix is present in the system, use linear solver;
     # otherwise, load a non linear solver.
     solver = nonlinsolve
     for equation in equations:
-        if isinstance(equation, sp.Matrix):
+        if isinstance(equation, sp.MatrixBase):
             solver = linsolve
             break
 
-    # Solve equations and extract solutions.
-    solution = solver(equations, *variables)
-    solution = {variable: list(solution)[0][pos] for
-                pos, variable in enumerate(variables)}
+    # Solve equations and extract first solution, if any.
+    solution = next(iter(solver(list(equations), *variables)), ())
+    return dict(zip(variables, solution))
+
+
+def solve_equations_system(variables, equations, replace_values=None):
+    """Solve linear and non linear equations system using Sympy library.
+
+    Parameters
+    ----------
+    variables : list of str
+        Name of independent variable to solve for.
+    equations : list of sympy equations objects
+        Conform the equations system.
+    replace_values : dict, optional
+        If given, substitute variables for numeric values established
+        in dict, as variable name:value pairs. Default is None.
 
-    # Replace constants and extract values.
+    Returns
+    -------
+    dict
+        Variable name: Solution value pairs, empty if the system has
+        no solution.
+    """
+    # Solve system symbolically, matrices made immutable to hash the
+    # system as key of cached solutions.
+    equations = tuple(sp.ImmutableMatrix(equation) if
+                      isinstance(equation, sp.MatrixBase) else equation
+                      for equation in equations)
+    solution = dict(solve_equations_symbolically(tuple(variables),
+                                                 equations))
+
+    # Replace constants and extract values, simplify only those still
+    # symbolic and keep fully substituted ones exact.
     if replace_values is not None:
-        solution = {key: sp.simplify(eval_sympy(val, replace_values)) for
-                    key, val in solution.items()}
+        for key, val in solution.items():
+            val = eval_sympy(val, replace_values)
+            solution[key] = sp.simplify(val) if val.free_symbols else val
 
     # Try to show solution with Latex, use ascii if not possible.
     try:
@@ -402,3 +595,30 @@ def solve_equations_system(variables, equations, replace_values=None):
     except ImportError:
         print(solution)
     return solution
+
+
+@lru_cache(maxsize=4096)
+def substitute_sympy(expression, substitutions):
+    """Substitute values into sympy expressions recursively, cached.
+
+    Parameters
+    ----------
+    expression : sympy object
+        Algebraic expression.
+    substitutions : frozenset of tuples
+        Sympy variable, value pairs to substitute from.
+
+    Returns
+    -------
+    sympy object
+        Evaluated algebraic expression.
+    """
+    # Attempt a symbolic eval, check for expression changes, return when
+    # no more changes occur.
+    substitute_dict = dict(substitutions)
+    for _ in range(0, len(substitute_dict) + 1):
+        new_expr = expression.xreplace(substitute_dict)
+        if new_expr == expression:
+            break
+        expression = new_expr
+    return new_expr
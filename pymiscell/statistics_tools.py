@@ -12,6 +12,31 @@ import numpy as np
 
 from . import math_tools as mt
 
+# Compile sequence generation loops when numba is available, otherwise
+# use numpy array operations.
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+
+if njit is not None:
+    @njit(fastmath=True, cache=True)
+    def halton_kernel(primes, points_no, matrix):
+        """Fill matrix rows with Halton points, one prime per dimension."""
+        for dim in range(primes.shape[0]):
+            prime = primes[dim]
+            inverse = 1.0 / prime
+            for point in range(points_no):
+                edge = point + 1
+                factor = inverse
+                sum_ = 0.0
+                while edge > 0:
+                    sum_ += (edge % prime) * factor
+                    edge //= prime
+                    factor *= inverse
+                matrix[dim, point] = sum_
+
 
 def calculate_empirical_cdf(variable_values):
     """Calculate numerical cumulative distribution function.
@@ -91,29 +116,31 @@ def generate_halton_sequence(dims_no, points_no):
     numpy array
         Multidimensional array with generated points, in (0, 1) range.
     """
-    # Initialize empty arrays and fill them with nan values.
-    matrix = np.empty(points_no * dims_no)
+    # Initialize empty array and fill it with nan values. Points of each
+    # dimension are stored contiguously, in rows.
+    matrix = np.empty((dims_no, points_no))
     matrix.fill(np.nan)
-    points_values = np.empty(points_no)
-    points_values.fill(np.nan)
 
-    # Run generator and fill output arrays
+    # Run compiled generator if possible.
     primes = mt.generate_primes(dims_no)
+    if njit is not None:
+        halton_kernel(np.asarray(primes, dtype=np.int64), points_no, matrix)
+        return matrix.T
+
+    # Otherwise, add up radical inverse digits of all points at once,
+    # one digit position at a time, for each dimension.
     log_points = math.log(points_no + 1)
-    for dim in range(dims_no):
-        prime = primes[dim]
+    for dim, prime in enumerate(primes):
         limit = int(math.ceil(log_points / math.log(prime)))
-        power = pow
+        edges = np.arange(1, points_no + 1)
+        row = matrix[dim]
+        row.fill(0)
+        inverse = factor = 1.0 / prime
         for _ in range(limit):
-            points_values[_] = power(prime, -(_ + 1))
-        for point in range(points_no):
-            edge = point + 1
-            sum_ = math.fmod(edge, prime) * points_values[0]
-            for _ in range(1, limit):
-                edge = math.floor(edge / prime)
-                sum_ += math.fmod(edge, prime) * points_values[_]
-            matrix[point * dims_no + dim] = sum_
-    return matrix.reshape(points_no, dims_no)
+            row += (edges % prime) * factor
+            edges //= prime
+            factor *= inverse
+    return matrix.T
 
 
 def generate_monte_carlo_sequence(dims_no, points_no):
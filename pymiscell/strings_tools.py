@@ -8,6 +8,11 @@ https://github.com/rodrigo1392
 
 import re
 import string
+from itertools import chain
+
+
+DIGIT_PATTERN = re.compile(r'\d')
+NUMBER_PATTERN = re.compile(r'\d+')
 
 
 def check_str_for_digits(input_string):
@@ -23,7 +28,7 @@ def check_str_for_digits(input_string):
     bool
         True if any digit is found, False otherwise.
     """
-    return any(char.isdigit() for char in input_string)
+    return DIGIT_PATTERN.search(input_string) is not None
 
 
 def extract_number_from_str(input_string):
@@ -38,8 +43,16 @@ def extract_number_from_str(input_string):
     -------
     int
         Last number found in string. May contain multiple digits.
+
+    Raises
+    ------
+    IndexError
+        No digits found in `input_string`.
     """
-    return int(re.findall(r'\d+', str(input_string))[-1])
+    match = search_last_number(input_string)
+    if match is None:
+        raise IndexError('No digits found in string')
+    return int(match.group())
 
 
 def format_strings_for_cmd(input_list):
@@ -69,9 +82,9 @@ def get_uniques_in_list_of_lists(input_list):
     Returns
     -------
     List
-        Unique values in input object.
+        Unique values in input object, in order of first appearance.
     """
-    return list({item for sublist in input_list for item in sublist})
+    return list(dict.fromkeys(chain.from_iterable(input_list)))
 
 
 def list_characters(start_char='A', end_char='Z', capitalize=True):
@@ -102,9 +115,8 @@ def list_characters(start_char='A', end_char='Z', capitalize=True):
         'Input data should be string type'
 
     # Get list of ascii characters and with 'aa', 'ab', etc.
-    base_list = list(string.ascii_lowercase)
-    for i in base_list:
-        base_list = base_list + [i + c for c in string.ascii_lowercase]
+    letters = string.ascii_lowercase
+    base_list = list(letters) + [i + c for i in letters for c in letters]
 
     # Extract chars of interest and capitalize.
     output_list = base_list[base_list.index(start_char.lower()):
@@ -114,6 +126,27 @@ def list_characters(start_char='A', end_char='Z', capitalize=True):
     return output_list
 
 
+def search_last_number(input_string):
+    """Find last integer (may have several digits) match in string.
+
+    Parameters
+    ----------
+    input_string : str
+        String to search in.
+
+    Returns
+    -------
+    re.Match
+        Match of last number found in string.
+    None
+        If no digits are found.
+    """
+    match = None
+    for match in NUMBER_PATTERN.finditer(str(input_string)):
+        pass
+    return match
+
+
 def sort_strings_by_digit(paths_list):
     """Try to sort strings by the digits present in them.
 
@@ -130,11 +163,12 @@ def sort_strings_by_digit(paths_list):
     List of strings
         Sorted strings if possible.
     """
-    # Extract integers and try to sort input list by them. Catch and
-    # report digits error.
+    # Extract integers and try to sort input list by them, with a
+    # stable sort over a string sorted list, so strings with equal
+    # numbers keep alphabetical order. Catch and report digits error.
     try:
-        numbers = [extract_number_from_str(i) for i in paths_list]
-        paths_list = [x for _, x in sorted(zip(numbers, paths_list))]
+        paths_list = sorted(sorted(paths_list, key=str),
+                            key=extract_number_from_str)
     except IndexError:
         print('WARNING: COULD NOT SORT STRINGS LIST BY NUMBER')
     return paths_list
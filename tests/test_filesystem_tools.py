@@ -22,6 +22,7 @@ def test_config_extractor():
                  "[DATABASE]",
                  "DATABASE_FOLDER = C:/abaqus_results/",
                  "EXTRACTION_ALGORITHM = ''",
+                 "SOLVER = standard",
                  "[OUTPUT_GATHER]",
                  "GUI = 0"
                  ]
@@ -34,6 +35,7 @@ def test_config_extractor():
     string1 = config_dict['analysis_folder']
     string2 = config_dict['database_folder']
     empty_str = config_dict['extraction_algorithm']
+    bare_str = config_dict['solver']
     float_list = config_dict['normal_values']
 
     assert isinstance(int_var, int)
@@ -41,7 +43,135 @@ def test_config_extractor():
     assert isinstance(string2, str)
     assert string1 == string2
     assert isinstance(empty_str, str)
+    assert bare_str == 'standard'
     assert isinstance(float_list[0], float)
 
     # Delete temporal file.
     Path.unlink(example_cfg)
+
+
+def test_file_renumber():
+    """A simple test for file renumbering function.
+
+    Check that only the last number in file name is modified.
+    """
+
+    # Create temporal folder and file, with digits in both names.
+    example_folder = Path(Path.cwd(), 'temporal_folder_2')
+    example_folder.mkdir()
+    example_file = Path(example_folder, 'model_2_step_2.txt')
+    example_file.touch()
+
+    # Execute tests.
+    output_path = ft.renumber_file(example_file, 3)
+
+    assert output_path == Path(example_folder, 'model_2_step_5.txt')
+    assert output_path.exists()
+    assert not example_file.exists()
+
+    # Check digits in file suffix are not modified.
+    example_video = Path(example_folder, 'shot_1.mp4')
+    example_video.touch()
+    video_path = ft.renumber_file(example_video, 1)
+
+    assert video_path == Path(example_folder, 'shot_2.mp4')
+
+    # Delete temporal files and folder.
+    Path.unlink(output_path)
+    Path.unlink(video_path)
+    example_folder.rmdir()
+
+
+def test_files_renumber():
+    """A simple test for multiple files renumbering function.
+
+    Check that a consecutive series of files can be shifted without
+    overwriting any of them.
+    """
+
+    # Create temporal folder and consecutive files.
+    example_folder = Path(Path.cwd(), 'temporal_folder')
+    example_folder.mkdir()
+    example_files = []
+    for model_n in ['1', '2', '3']:
+        example_file = Path(example_folder, 'model_' + model_n + '.txt')
+        example_file.write_text(model_n)
+        example_files.append(example_file)
+
+    # Execute tests.
+    output_paths = ft.renumber_files(example_files, 1)
+
+    assert [i.name for i in output_paths] == ['model_2.txt', 'model_3.txt',
+                                              'model_4.txt']
+    assert [i.read_text() for i in output_paths] == ['1', '2', '3']
+    assert not example_files[0].exists()
+
+    # Delete temporal files and folder.
+    for i in output_paths:
+        Path.unlink(i)
+    example_folder.rmdir()
+
+
+def test_files_renumber_existing_target():
+    """A test for multiple files renumbering with occupied new names.
+
+    Check that files outside the series are not overwritten and that
+    no file is renamed.
+    """
+
+    # Create temporal folder, a series of files and an unlisted file.
+    example_folder = Path(Path.cwd(), 'temporal_folder_3')
+    example_folder.mkdir()
+    example_files = []
+    for model_n in ['2', '3', '4']:
+        example_file = Path(example_folder, 'model_' + model_n + '.txt')
+        example_file.write_text(model_n)
+        example_files.append(example_file)
+
+    # Execute tests.
+    try:
+        ft.renumber_files(example_files[:2], 1)
+        raised = False
+    except FileExistsError:
+        raised = True
+
+    assert raised
+    assert [i.read_text() for i in example_files] == ['2', '3', '4']
+
+    # Delete temporal files and folder.
+    for i in example_files:
+        Path.unlink(i)
+    example_folder.rmdir()
+
+
+def test_files_renumber_repeated_names():
+    """A test for multiple files renumbering with repeated names.
+
+    Check that repeated files or repeated new names are rejected before
+    any file is renamed.
+    """
+
+    # Create temporal folder and files whose numbers are equal.
+    example_folder = Path(Path.cwd(), 'temporal_folder_4')
+    example_folder.mkdir()
+    example_files = []
+    for model_n in ['1', '01']:
+        example_file = Path(example_folder, 'model_' + model_n + '.txt')
+        example_file.write_text(model_n)
+        example_files.append(example_file)
+
+    # Execute tests.
+    for files_list, error in [(example_files, FileExistsError),
+                              (example_files[:1] * 2, ValueError)]:
+        try:
+            ft.renumber_files(files_list, 1)
+            raised = False
+        except error:
+            raised = True
+        assert raised
+    assert [i.read_text() for i in example_files] == ['1', '01']
+
+    # Delete temporal files and folder.
+    for i in example_files:
+        Path.unlink(i)
+    example_folder.rmdir()